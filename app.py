@@ -1,6 +1,9 @@
 import argparse
 from src.process.ingest import ingest
 from src.process.run import run_query, export_direct
+from src.process.watch import watch
+from src.common.config import INGEST_WORKERS, WATCH_INTERVAL, WATCH_DEBOUNCE, RESULTS_DIR, DATA_DIR, DATASET_TARGET_FILE_ROWS
+from src.common.dataset import compact_dataset
 
 def main():
     parser = argparse.ArgumentParser(description="Schema-agnostic Pilot Training Retriever (LangChain + LangGraph + FAISS)")
@@ -8,23 +11,38 @@ def main():
 
     p_ing = sub.add_parser("ingest", help="Ingest folders of .json records into FAISS")
     p_ing.add_argument("folders", nargs="+", help="Folders (e.g., ./virginair ./airtransat)")
+    p_ing.add_argument("--workers", type=int, default=INGEST_WORKERS, help="Parallel shard builders (merged into one index)")
+
+    p_watch = sub.add_parser("watch", help="Continuously ingest new/modified .json files into the live index")
+    p_watch.add_argument("folders", nargs="+", help="Folders to poll")
+    p_watch.add_argument("--interval", type=float, default=WATCH_INTERVAL, help="Seconds between polls")
+    p_watch.add_argument("--debounce", type=float, default=WATCH_DEBOUNCE, help="Quiet seconds before a batch is ingested")
 
     p_query = sub.add_parser("query", help="Run the LangGraph NL workflow (dynamic extraction, optional Parquet export)")
     p_query.add_argument("prompt", help="e.g., 'Give me all the detail information ... -> to a .parquet file'")
-    p_query.add_argument("--out", help="Optional output .parquet path")
+    p_query.add_argument("--out", help="Optional output .parquet/.csv/.jsonl path, or a directory to append to a partitioned dataset")
 
     p_exp = sub.add_parser("export", help="Direct export by filters (no NL parsing)")
     p_exp.add_argument("--airline", required=True)
     p_exp.add_argument("--training-type", required=True)
     p_exp.add_argument("--out", required=True)
 
+    p_cmp = sub.add_parser("compact", help="Merge small files in a partitioned results dataset")
+    p_cmp.add_argument("path", nargs="?", default=str(RESULTS_DIR), help="Dataset directory (relative to DATA_DIR)")
+    p_cmp.add_argument("--target-rows", type=int, default=DATASET_TARGET_FILE_ROWS, help="Max rows per merged file")
+
     args = parser.parse_args()
     if args.cmd == "ingest":
-        ingest(args.folders)
+        ingest(args.folders, args.workers)
+    elif args.cmd == "watch":
+        watch(args.folders, args.interval, args.debounce)
     elif args.cmd == "query":
         run_query(args.prompt, args.out)
     elif args.cmd == "export":
         export_direct(args.airline, args.training_type, args.out)
+    elif args.cmd == "compact":
+        stats = compact_dataset(DATA_DIR / args.path, args.target_rows)
+        print(f"✅ Compacted {stats['merged']} files into {stats['written']}")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
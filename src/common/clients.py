@@ -0,0 +1,201 @@
+import time
+import random
+import hashlib
+import threading
+from functools import lru_cache
+from typing import Dict, Optional, Tuple
+
+import httpx
+from openai import OpenAI
+
+from .config import (
+    CHAT_MODEL, OPENAI_API_KEY, BASE_URL,
+    MODEL_TIMEOUT, MODEL_MAX_CONNECTIONS, MODEL_MAX_CONCURRENCY, MODEL_RPS,
+    MODEL_MAX_RETRIES, MODEL_BACKOFF_BASE, MODEL_BACKOFF_MAX,
+    BREAKER_THRESHOLD, BREAKER_COOLDOWN,
+)
+
+_RETRY_STATUS = {408, 409, 429, 500, 502, 503, 504}
+
+class CircuitOpenError(httpx.TransportError):
+    """Raised without touching the network while the breaker is open."""
+
+# ---- Resilience primitives ----
+class _RateLimiter:
+    """Token bucket shared by all model traffic; rps <= 0 disables it."""
+
+    def __init__(self, rps: float):
+        self.rps = rps
+        self._lock = threading.Lock()
+        self._next = time.monotonic()
+
+    def acquire(self):
+        if self.rps <= 0:
+            return
+        with self._lock:
+            now = time.monotonic()
+            slot = max(self._next, now)
+            self._next = slot + 1.0 / self.rps
+        if slot > now:
+            time.sleep(slot - now)
+
+class _CircuitBreaker:
+    def __init__(self, threshold: int, cooldown: float, probe_timeout: float):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.probe_lease = max(cooldown, probe_timeout)   # a probe is one attempt, bounded by the HTTP timeout
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._probe_at: Optional[float] = None   # set while the single half-open probe is in flight
+
+    def check(self) -> Optional[float]:
+        """Raise while open; in half-open, return the probe token the caller passes back to record()."""
+        with self._lock:
+            if self._opened_at is None:
+                return None
+            now = time.monotonic()
+            # Half-open: exactly one request probes the endpoint (a probe that never
+            # reports back is replaced once its lease expires)
+            if now - self._opened_at >= self.cooldown and (
+                    self._probe_at is None or now - self._probe_at >= self.probe_lease):
+                self._probe_at = now
+                return now
+            raise CircuitOpenError(f"Model endpoint circuit open after {self._failures} consecutive failures")
+
+    def record(self, ok: bool, probe: Optional[float] = None):
+        with self._lock:
+            # Only the current probe releases the slot: not requests that started before
+            # the breaker opened, nor a timed-out probe that was already replaced
+            if probe is not None and probe == self._probe_at:
+                self._probe_at = None
+            if ok:
+                self._failures = 0
+                self._opened_at = None
+                return
+            self._failures += 1
+            if self.threshold > 0 and self._failures >= self.threshold:
+                self._opened_at = time.monotonic()
+
+class _InFlight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Optional[Tuple[int, list, bytes]] = None
+        self.error: Optional[BaseException] = None
+
+def _decoded_headers(resp: httpx.Response) -> list:
+    # Body is already decoded; drop encoding/length so per-caller copies are rebuilt cleanly
+    return [(k, v) for k, v in resp.headers.multi_items()
+            if k.lower() not in ("content-encoding", "content-length", "transfer-encoding")]
+
+# ---- Transport ----
+class ResilientTransport(httpx.BaseTransport):
+    """
+    Wraps a pooled keep-alive transport with a global concurrency cap, a rate
+    budget, exponential backoff with full jitter (honouring Retry-After), a
+    circuit breaker, and coalescing of identical in-flight requests.
+    """
+
+    def __init__(self, share: int = 1):
+        self._inner = httpx.HTTPTransport(limits=httpx.Limits(
+            max_connections=MODEL_MAX_CONNECTIONS, max_keepalive_connections=MODEL_MAX_CONNECTIONS))
+        # `share` processes split the global budgets between them
+        self._slots = threading.BoundedSemaphore(max(MODEL_MAX_CONCURRENCY // share, 1))
+        self._rate = _RateLimiter(MODEL_RPS / share)
+        self._breaker = _CircuitBreaker(BREAKER_THRESHOLD, BREAKER_COOLDOWN, MODEL_TIMEOUT)
+        self._lock = threading.Lock()
+        self._inflight: Dict[str, _InFlight] = {}
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        body = request.read()
+        key = hashlib.sha256(b"\n".join([
+            request.method.encode(), str(request.url).encode(),
+            request.headers.get("authorization", "").encode(), body,
+        ])).hexdigest()
+        with self._lock:
+            entry = self._inflight.get(key)
+            leader = entry is None
+            if leader:
+                entry = self._inflight[key] = _InFlight()
+        if leader:
+            try:
+                entry.result = self._send_with_retries(request)
+            except BaseException as e:
+                entry.error = e
+            finally:
+                with self._lock:
+                    self._inflight.pop(key, None)
+                entry.done.set()
+        else:
+            entry.done.wait()
+        if entry.error is not None:
+            raise entry.error
+        status, headers, content = entry.result
+        return httpx.Response(status, headers=headers, content=content, request=request)
+
+    def _send_with_retries(self, request: httpx.Request) -> Tuple[int, list, bytes]:
+        for attempt in range(MODEL_MAX_RETRIES + 1):
+            probe = self._breaker.check()
+            self._rate.acquire()
+            retry_after = None
+            try:
+                with self._slots:
+                    resp = self._inner.handle_request(request)
+                    content = resp.read()
+                    resp.close()
+            except httpx.TransportError:
+                self._breaker.record(False, probe)
+                if attempt == MODEL_MAX_RETRIES:
+                    raise
+            else:
+                if resp.status_code not in _RETRY_STATUS:
+                    self._breaker.record(resp.status_code < 500, probe)
+                    return resp.status_code, _decoded_headers(resp), content
+                self._breaker.record(False, probe)
+                if attempt == MODEL_MAX_RETRIES:
+                    return resp.status_code, _decoded_headers(resp), content
+                try:
+                    retry_after = float(resp.headers.get("retry-after", ""))
+                except ValueError:
+                    retry_after = None
+            delay = random.uniform(0, min(MODEL_BACKOFF_MAX, MODEL_BACKOFF_BASE * 2 ** attempt))
+            time.sleep(max(delay, retry_after or 0.0))
+
+    def close(self):
+        self._inner.close()
+
+# ---- Factory: every model client shares one pooled, budgeted HTTP client ----
+_budget_share = 1
+
+def share_budgets(processes: int):
+    """
+    Pool initializer for worker processes that call the model concurrently:
+    each gets 1/`processes` of MODEL_MAX_CONCURRENCY and MODEL_RPS, so the
+    budgets stay global across the pool. Drops clients inherited via fork.
+    """
+    global _budget_share
+    _budget_share = max(processes, 1)
+    for factory in (get_http_client, get_openai_client, get_chat_model):
+        factory.cache_clear()
+    from .embeddings import get_embeddings
+    get_embeddings.cache_clear()
+
+@lru_cache(maxsize=None)
+def get_http_client() -> httpx.Client:
+    return httpx.Client(transport=ResilientTransport(_budget_share), timeout=MODEL_TIMEOUT)
+
+@lru_cache(maxsize=None)
+def get_openai_client(api_key: str = OPENAI_API_KEY) -> OpenAI:
+    # Retries live in the shared transport; SDK retries would multiply them
+    return OpenAI(api_key=api_key, base_url=BASE_URL, http_client=get_http_client(), max_retries=0)
+
+@lru_cache(maxsize=None)
+def get_chat_model(model: str = CHAT_MODEL):
+    from langchain_openai import ChatOpenAI
+    return ChatOpenAI(model=model, api_key=OPENAI_API_KEY, base_url=BASE_URL, temperature=0,
+                      http_client=get_http_client(), max_retries=0)
+
+def get_openai_embeddings(model: str, api_key: str, chunk_size: int):
+    from langchain_openai import OpenAIEmbeddings
+    return OpenAIEmbeddings(model=model, api_key=api_key, base_url=BASE_URL, chunk_size=chunk_size,
+                            http_client=get_http_client(), max_retries=0)
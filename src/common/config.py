@@ -13,10 +13,38 @@ OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", "YOUR_API_KEY")
 EMBED_MODEL_API_KEY = os.getenv("EMBED_MODEL_API_KEY", "YOUR_API_KEY")
 BASE_URL = os.getenv("BASE_URL", "YOUR_BASE_URL")
 
+# Shared model client (all chat + embedding traffic goes through one pooled HTTP client)
+MODEL_TIMEOUT = float(os.getenv("MODEL_TIMEOUT", "60"))
+MODEL_MAX_CONNECTIONS = int(os.getenv("MODEL_MAX_CONNECTIONS", "32"))   # keep-alive pool size
+MODEL_MAX_CONCURRENCY = int(os.getenv("MODEL_MAX_CONCURRENCY", "16"))   # in-flight requests, global
+MODEL_RPS = float(os.getenv("MODEL_RPS", "0"))                          # requests/second budget, 0 = unlimited
+MODEL_MAX_RETRIES = int(os.getenv("MODEL_MAX_RETRIES", "5"))
+MODEL_BACKOFF_BASE = float(os.getenv("MODEL_BACKOFF_BASE", "0.5"))      # seconds, doubled per attempt (full jitter)
+MODEL_BACKOFF_MAX = float(os.getenv("MODEL_BACKOFF_MAX", "20"))
+BREAKER_THRESHOLD = int(os.getenv("BREAKER_THRESHOLD", "8"))            # consecutive failures that open the circuit
+BREAKER_COOLDOWN = float(os.getenv("BREAKER_COOLDOWN", "30"))           # seconds before a half-open probe
+
+# Embedding provider
+#  - openai: remote OpenAI-compatible endpoint (default)
+#  - hashing: in-process signed feature hashing (no model files, no network)
+#  - local: sentence-transformers model loaded from LOCAL_EMBED_MODEL_DIR
+EMBED_PROVIDER = os.getenv("EMBED_PROVIDER", "openai").lower()
+EMBED_DIM = int(os.getenv("EMBED_DIM", "1024"))                # hashing only
+LOCAL_EMBED_MODEL_DIR = os.getenv("LOCAL_EMBED_MODEL_DIR", "")
+LOCAL_EMBED_BACKEND = os.getenv("LOCAL_EMBED_BACKEND", "torch").lower()  # torch | onnx
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "256"))
+EMBED_WORKERS = int(os.getenv("EMBED_WORKERS", str(os.cpu_count() or 1)))
+
 # Storage
+#  Each ingest / watch batch publishes an immutable snapshot under snapshots/<version>/
+#  (faiss_index/ + manifest.parquet); CURRENT names the live one. Without CURRENT,
+#  the legacy layout (FAISS_DIR + MANIFEST_PATH directly under DATA_DIR) is read.
 DATA_DIR = Path(os.getenv("DATA_DIR", "data")).resolve()
 FAISS_DIR = DATA_DIR / "faiss_index"
 MANIFEST_PATH = DATA_DIR / "manifest.parquet"
+SNAPSHOTS_DIR = DATA_DIR / "snapshots"
+CURRENT_PATH = DATA_DIR / "CURRENT"
+SNAPSHOT_KEEP = int(os.getenv("SNAPSHOT_KEEP", "3"))   # older snapshots kept for in-flight queries
 
 # Digest strategy
 #  - verbatim: exact file contents
@@ -25,6 +53,29 @@ MANIFEST_PATH = DATA_DIR / "manifest.parquet"
 DIGEST_MODE = os.getenv("DIGEST_MODE", "pathlines").lower()
 CHUNK_SIZE = int(os.getenv("CHUNK_SIZE", "2000"))     # chars (approx tokens)
 CHUNK_OVERLAP = int(os.getenv("CHUNK_OVERLAP", "200"))
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "1"))  # >1: build shard indexes in parallel, then merge
+
+# Watch mode (app.py watch)
+WATCH_INTERVAL = float(os.getenv("WATCH_INTERVAL", "2"))  # seconds between folder polls
+WATCH_DEBOUNCE = float(os.getenv("WATCH_DEBOUNCE", "3"))  # quiet seconds before a micro-batch is ingested
 
 # Retrieval
-TOP_K = int(os.getenv("TOP_K", "50"))
+TOP_K = int(os.getenv("TOP_K", "50"))                            # unique documents per query
+RETRIEVE_OVERSAMPLE = int(os.getenv("RETRIEVE_OVERSAMPLE", "4"))  # initial chunks fetched per requested document
+DOC_SCORE_AGG = os.getenv("DOC_SCORE_AGG", "max").lower()        # max | sum of chunk similarities per document
+EXTRACT_CONCURRENCY = int(os.getenv("EXTRACT_CONCURRENCY", "4"))  # parallel extraction calls per query
+DOC_CENTROIDS = os.getenv("DOC_CENTROIDS", "0").lower() in ("1", "true", "yes")  # first-pass doc-centroid index
+
+# Query-result cache (keyed by parsed filters + query embedding, tagged with the index snapshot)
+QUERY_CACHE = os.getenv("QUERY_CACHE", "1").lower() in ("1", "true", "yes")
+QUERY_CACHE_PATH = DATA_DIR / "query_cache.sqlite"
+QUERY_CACHE_THRESHOLD = float(os.getenv("QUERY_CACHE_THRESHOLD", "0.95"))  # cosine similarity for a hit
+QUERY_CACHE_TTL = float(os.getenv("QUERY_CACHE_TTL", "86400"))             # seconds
+QUERY_CACHE_MAX_ENTRIES = int(os.getenv("QUERY_CACHE_MAX_ENTRIES", "1000"))  # LRU beyond this
+QUERY_CACHE_MAX_ROWS = int(os.getenv("QUERY_CACHE_MAX_ROWS", "5000"))      # larger results are not cached
+
+# Results dataset (--out <dir>/): Hive-partitioned airline=/training_type=/run_date=, append-only
+RESULTS_DIR = DATA_DIR / "results"                                          # default for app.py compact
+DATASET_ROW_GROUP_ROWS = int(os.getenv("DATASET_ROW_GROUP_ROWS", "65536"))
+DATASET_TARGET_FILE_ROWS = int(os.getenv("DATASET_TARGET_FILE_ROWS", "1000000"))  # compaction output size
+DATASET_SMALL_FILE_BYTES = int(os.getenv("DATASET_SMALL_FILE_BYTES", str(32 * 1024 * 1024)))  # compaction input
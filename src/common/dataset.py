@@ -0,0 +1,137 @@
+import os
+import time
+import uuid
+import shutil
+from pathlib import Path
+from datetime import datetime, timezone
+from typing import Dict, List
+
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from .config import DATASET_ROW_GROUP_ROWS, DATASET_TARGET_FILE_ROWS, DATASET_SMALL_FILE_BYTES
+from .sinks import RowSink, OUTPUT_COLUMNS
+
+PARTITION_COLUMNS = ["airline", "training_type", "run_date"]
+# Few distinct values per file: stored as Arrow dictionaries / Parquet dictionary pages
+DICTIONARY_COLUMNS = ["Role", "Aircraft", "From", "To", "Autoland", "document_type", "run_id"]
+
+def _type(c: str) -> pa.DataType:
+    return pa.dictionary(pa.int32(), pa.string()) if c in DICTIONARY_COLUMNS else pa.string()
+
+# Partition columns live in the directory names, not in the files
+FILE_SCHEMA = pa.schema([(c, _type(c)) for c in OUTPUT_COLUMNS + ["run_id"] if c not in PARTITION_COLUMNS])
+PARTITIONING = ds.partitioning(pa.schema([(c, pa.string()) for c in PARTITION_COLUMNS]), flavor="hive")
+
+def _file_options():
+    return ds.ParquetFileFormat().make_write_options(use_dictionary=DICTIONARY_COLUMNS, compression="zstd")
+
+def _publish(staging: Path, root: Path) -> int:
+    """
+    Move finished files into their partitions. Each file rename is atomic, so
+    no reader sees a partial file; a run spanning several partitions becomes
+    visible one file at a time.
+    """
+    moved = 0
+    for fp in sorted(staging.rglob("*.parquet")):
+        dest = root / fp.relative_to(staging)
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(fp, dest)
+        moved += 1
+    shutil.rmtree(staging, ignore_errors=True)
+    return moved
+
+class DatasetSink(RowSink):
+    """
+    Appends result rows to a Hive-partitioned Parquet dataset. Files are
+    written under a hidden staging directory (ignored by pyarrow/pandas
+    readers) and renamed into place on close; an interrupted run adds nothing.
+    """
+
+    def __init__(self, root: Path, batch_rows: int = DATASET_ROW_GROUP_ROWS):
+        super().__init__()
+        self.root = root
+        self.run_id = f"{time.strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:8]}"
+        self.run_date = datetime.now(timezone.utc).date().isoformat()
+        self._staging = root / f".staging-{self.run_id}"
+        self._batch_rows = batch_rows
+        self._buf: List[List[str]] = []
+        self._flushes = 0
+
+    def _write(self, values: List[str]):
+        self._buf.append(values)
+        if len(self._buf) >= self._batch_rows:
+            self._flush()
+
+    def _flush(self):
+        if not self._buf:
+            return
+        cols = dict(zip(OUTPUT_COLUMNS, zip(*self._buf)))
+        n = len(self._buf)
+        cols.update(run_date=[self.run_date] * n, run_id=[self.run_id] * n)
+        table = pa.table({c: pa.array(v, type=pa.string()) for c, v in cols.items()})
+        table = table.cast(pa.schema([(f.name, _type(f.name)) for f in table.schema]))
+        ds.write_dataset(
+            table, self._staging, format="parquet", partitioning=PARTITIONING,
+            basename_template=f"part-{self.run_id}-{self._flushes}-{{i}}.parquet",
+            file_options=_file_options(), max_rows_per_group=DATASET_ROW_GROUP_ROWS,
+            existing_data_behavior="overwrite_or_ignore",
+        )
+        self._flushes += 1
+        self._buf = []
+
+    def close(self):
+        self._flush()
+        _publish(self._staging, self.root)
+
+    def __exit__(self, exc_type, *exc):
+        if exc_type is not None:
+            shutil.rmtree(self._staging, ignore_errors=True)
+            return
+        self.close()
+
+def open_dataset(root: Path) -> ds.Dataset:
+    """Partition-aware view for consumers; filters on airline/training_type/run_date prune directories."""
+    return ds.dataset(root, format="parquet", partitioning="hive")
+
+def _visible(fp: Path) -> bool:
+    # Same rule as pyarrow/pandas dataset discovery: '.'/'_' prefixed names are not data
+    return not fp.name.startswith((".", "_"))
+
+def _leaf_partitions(root: Path) -> List[Path]:
+    return sorted({fp.parent for fp in root.rglob("*.parquet")
+                   if not any(part.startswith((".", "_")) for part in fp.relative_to(root).parts)})
+
+def compact_dataset(root: Path, target_rows: int = DATASET_TARGET_FILE_ROWS,
+                    small_bytes: int = DATASET_SMALL_FILE_BYTES) -> Dict[str, int]:
+    """
+    Merge small files within each partition into files of up to `target_rows`
+    rows. Merged files are renamed into place before the inputs are removed,
+    so readers may briefly see duplicates but never miss rows. Leftover
+    hidden outputs of an interrupted run are deleted, never merged.
+    """
+    merged = written = 0
+    for part_dir in _leaf_partitions(root):
+        # Output of an interrupted compaction; its inputs were never removed
+        for stale in part_dir.glob(".compact-*.parquet"):
+            stale.unlink()
+        small = sorted(fp for fp in part_dir.glob("*.parquet") if _visible(fp) and fp.stat().st_size < small_bytes)
+        if len(small) < 2:
+            continue
+        table = pa.concat_tables(
+            [pq.read_table(fp, schema=FILE_SCHEMA) for fp in small]).combine_chunks()
+        stamp = f"{time.strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:8]}"
+        tmp_files = []
+        for i, start in enumerate(range(0, table.num_rows, max(target_rows, 1))):
+            tmp = part_dir / f".compact-{stamp}-{i}.parquet"
+            pq.write_table(table.slice(start, target_rows), tmp, row_group_size=DATASET_ROW_GROUP_ROWS,
+                           use_dictionary=DICTIONARY_COLUMNS, compression="zstd")
+            tmp_files.append(tmp)
+        for tmp in tmp_files:
+            os.replace(tmp, part_dir / tmp.name.replace(".compact-", "part-compacted-"))
+        for fp in small:
+            fp.unlink()
+        merged += len(small)
+        written += len(tmp_files)
+    return {"merged": merged, "written": written}
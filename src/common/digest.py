@@ -1,4 +1,5 @@
 import json
+import hashlib
 from typing import Any, Dict, List
 from .config import DIGEST_MODE, CHUNK_SIZE, CHUNK_OVERLAP
 
@@ -33,12 +34,19 @@ def _chunk(text: str) -> List[str]:
         i = max(j - CHUNK_OVERLAP, 0)
     return chunks
 
+def canonical_json(doc: Any) -> str:
+    return json.dumps(doc, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+
+def content_hash(doc: Any) -> str:
+    """Identity of a record's content: same JSON under any path/key order => same hash."""
+    return hashlib.sha256(canonical_json(doc).encode("utf-8")).hexdigest()
+
 def digest_for_embedding(doc: dict, raw_text: str, file_path: str) -> List[str]:
     header = f"__FILE_PATH__={file_path}\n"
     if DIGEST_MODE == "verbatim":
         return [header + c for c in _chunk(raw_text)]
     if DIGEST_MODE == "canonical":
-        body = json.dumps(doc, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+        body = canonical_json(doc)
         return [header + c for c in _chunk(body)]
     # pathlines (default)
     flat = flatten_json(doc)
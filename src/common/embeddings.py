@@ -1,14 +1,123 @@
+import re
+import zlib
+import hashlib
 import numpy as np
-from typing import List
-from openai import OpenAI
-from .config import OPENAI_API_KEY, EMBED_MODEL, EMBED_MODEL_API_KEY, BASE_URL
+from functools import lru_cache
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from pathlib import Path
+from typing import List, Dict, Any, Optional
+from langchain_core.embeddings import Embeddings
+from .config import (
+    EMBED_MODEL, EMBED_MODEL_API_KEY,
+    EMBED_PROVIDER, EMBED_DIM, LOCAL_EMBED_MODEL_DIR, LOCAL_EMBED_BACKEND,
+    EMBED_BATCH_SIZE, EMBED_WORKERS,
+)
 
-_client = OpenAI(api_key=EMBED_MODEL_API_KEY, base_url=BASE_URL)
+_TOKEN_RE = re.compile(r"\w+")
+
+# ---- Hashing provider (CPU-only, no model files) ----
+def _hash_batch(texts: List[str], dim: int) -> np.ndarray:
+    """Signed feature hashing over unigrams + bigrams, sublinear tf, L2-normalized."""
+    out = np.zeros((len(texts), dim), dtype=np.float32)
+    for row, text in enumerate(texts):
+        toks = _TOKEN_RE.findall(text.lower())
+        feats = toks + [f"{a} {b}" for a, b in zip(toks, toks[1:])]
+        if not feats:
+            continue
+        h = np.fromiter((zlib.crc32(f.encode("utf-8")) for f in feats), dtype=np.uint64, count=len(feats))
+        idx = (h % dim).astype(np.int64)
+        sign = np.where((h >> 31) & 1, -1.0, 1.0).astype(np.float32)
+        np.add.at(out[row], idx, sign)
+    np.copysign(np.log1p(np.abs(out)), out, out=out)
+    norms = np.linalg.norm(out, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return out / norms
+
+class HashingEmbeddings(Embeddings):
+    provider = "hashing"
+
+    def __init__(self, dim: int = EMBED_DIM, batch_size: int = EMBED_BATCH_SIZE, workers: int = EMBED_WORKERS):
+        self.dim = dim
+        self.model = f"crc32-uni-bi-{dim}"
+        self.batch_size = max(batch_size, 1)
+        self.workers = max(workers, 1)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        batches = [texts[i:i + self.batch_size] for i in range(0, len(texts), self.batch_size)]
+        if self.workers > 1 and len(batches) > 1:
+            with ProcessPoolExecutor(max_workers=min(self.workers, len(batches))) as ex:
+                mats = list(ex.map(_hash_batch, batches, repeat(self.dim)))
+        else:
+            mats = [_hash_batch(b, self.dim) for b in batches]
+        if not mats:
+            return []
+        return np.vstack(mats).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return _hash_batch([text], self.dim)[0].tolist()
+
+# ---- Local model provider (sentence-transformers, torch or onnx backend) ----
+def _model_fingerprint(model_dir: str) -> str:
+    """Resolved directory plus a digest of its config files, so same-named models never match."""
+    path = Path(model_dir).resolve()
+    h = hashlib.sha256()
+    for name in ("config.json", "modules.json", "config_sentence_transformers.json"):
+        if (path / name).is_file():
+            h.update(name.encode() + b"\0" + (path / name).read_bytes())
+    return f"{path}#{h.hexdigest()[:16]}"
+
+class LocalModelEmbeddings(Embeddings):
+    provider = "local"
+
+    def __init__(self, model_dir: str = LOCAL_EMBED_MODEL_DIR, backend: str = LOCAL_EMBED_BACKEND,
+                 batch_size: int = EMBED_BATCH_SIZE, workers: int = EMBED_WORKERS):
+        if not model_dir:
+            raise ValueError("EMBED_PROVIDER=local requires LOCAL_EMBED_MODEL_DIR to point at a model directory.")
+        try:
+            import torch
+            from sentence_transformers import SentenceTransformer
+        except ImportError as e:
+            raise ImportError("EMBED_PROVIDER=local requires the 'sentence-transformers' package.") from e
+        torch.set_num_threads(max(workers, 1))
+        kwargs = {"backend": "onnx"} if backend == "onnx" else {}
+        self._model = SentenceTransformer(model_dir, device="cpu", **kwargs)
+        self.model = _model_fingerprint(model_dir)
+        self.dim = int(self._model.get_sentence_embedding_dimension())
+        self.batch_size = max(batch_size, 1)
+
+    def _encode(self, texts: List[str]) -> np.ndarray:
+        return self._model.encode(texts, batch_size=self.batch_size, normalize_embeddings=True,
+                                  convert_to_numpy=True, show_progress_bar=False).astype(np.float32)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self._encode(texts).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._encode([text])[0].tolist()
+
+# ---- Factory ----
+@lru_cache(maxsize=None)
+def get_embeddings(workers: Optional[int] = None) -> Embeddings:
+    """Configured provider; `workers` overrides EMBED_WORKERS (e.g. 1 inside ingest shard processes)."""
+    workers = workers or EMBED_WORKERS
+    if EMBED_PROVIDER == "hashing":
+        return HashingEmbeddings(workers=workers)
+    if EMBED_PROVIDER == "local":
+        return LocalModelEmbeddings(workers=workers)
+    if EMBED_PROVIDER == "openai":
+        from .clients import get_openai_embeddings
+        return get_openai_embeddings(EMBED_MODEL, EMBED_MODEL_API_KEY, EMBED_BATCH_SIZE)
+    raise ValueError(f"Unknown EMBED_PROVIDER '{EMBED_PROVIDER}' (expected openai | hashing | local).")
+
+def embedding_signature(dim: Optional[int] = None) -> Dict[str, Any]:
+    """Provider/model/dim of the configured backend; dim is None when unknown without a call."""
+    emb = get_embeddings()
+    return {
+        "provider": getattr(emb, "provider", EMBED_PROVIDER),
+        "model": getattr(emb, "model", EMBED_MODEL),
+        "dim": getattr(emb, "dim", dim),
+    }
 
 def embed_texts(texts: List[str]) -> np.ndarray:
-    vectors = []
-    # Simple per-text call (can be batched later if needed)
-    for t in texts:
-        r = _client.embeddings.create(model=EMBED_MODEL, input=t)
-        vectors.append(r.data[0].embedding)
-    return np.array(vectors, dtype=np.float32)
+    return np.array(get_embeddings().embed_documents(texts), dtype=np.float32)
@@ -1,8 +1,9 @@
 from pathlib import Path
 import json
 import pandas as pd
-from typing import Dict, Any
-from .config import DATA_DIR, MANIFEST_PATH
+from typing import Dict, Any, List, Optional
+from .config import DATA_DIR
+from .snapshots import manifest_path
 
 def ensure_dirs():
     DATA_DIR.mkdir(parents=True, exist_ok=True)
@@ -15,12 +16,18 @@ def safe_meta(doc: Dict[str, Any], key: str) -> str:
     except Exception:
         return "not found"
 
-def save_manifest(rows):
+def save_manifest(rows, path: Path):
     df = pd.DataFrame(rows)
-    df.to_parquet(MANIFEST_PATH, index=False)
+    df.to_parquet(path, index=False)
 
-def load_manifest() -> pd.DataFrame:
-    return pd.read_parquet(MANIFEST_PATH)
+def load_manifest(path: Optional[Path] = None) -> pd.DataFrame:
+    return pd.read_parquet(path or manifest_path())
+
+def source_paths(manifest: pd.DataFrame) -> List[List[str]]:
+    """Every source path per record; manifests written before content de-duplication have only 'path'."""
+    if "paths" in manifest:
+        return [[str(p) for p in ps] for ps in manifest["paths"]]
+    return [[str(p)] for p in manifest["path"]]
 
 def read_json_text(path: Path) -> str:
     return path.read_text(encoding="utf-8")
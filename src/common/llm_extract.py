@@ -1,9 +1,7 @@
 import json
 from typing import Dict, List
-from openai import OpenAI
-from .config import OPENAI_API_KEY, CHAT_MODEL, BASE_URL
-
-_client = OpenAI(api_key=OPENAI_API_KEY, base_url=BASE_URL)
+from .config import CHAT_MODEL
+from .clients import get_openai_client
 
 REQUESTED_FIELDS = ["Who", "Role", "Aircraft", "From", "To", "Duration", "Autoland"]
 
@@ -21,7 +19,7 @@ Return a compact JSON object with keys:
 - export_parquet (true/false)
 Only return JSON."""
     try:
-        resp = _client.chat.completions.create(
+        resp = get_openai_client().chat.completions.create(
             model=CHAT_MODEL,
             messages=[{"role":"system","content":sys},{"role":"user","content":user}],
             temperature=0
@@ -68,7 +66,7 @@ Return ONLY a JSON object with keys {requested_fields}, values as strings. For r
 - "From" = departure location/airport code if present, else "not found"
 - "To"   = arrival location/airport code if present, else "not found"
 Do not add extra keys."""
-    resp = _client.chat.completions.create(
+    resp = get_openai_client().chat.completions.create(
         model=CHAT_MODEL,
         messages=[{"role":"system","content":sys},{"role":"user","content":user}],
         temperature=0
@@ -0,0 +1,116 @@
+import re
+import json
+import time
+import sqlite3
+import numpy as np
+from typing import Dict, Any, List, Optional
+
+from .config import (
+    QUERY_CACHE_PATH, QUERY_CACHE_THRESHOLD, QUERY_CACHE_TTL, QUERY_CACHE_MAX_ENTRIES,
+)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    id          INTEGER PRIMARY KEY,
+    tag         TEXT NOT NULL,     -- index snapshot the rows were computed against
+    filters_key TEXT NOT NULL,
+    prompt_key  TEXT NOT NULL,
+    vector      BLOB NOT NULL,     -- L2-normalized float32 query embedding
+    rows        TEXT NOT NULL,
+    created     REAL NOT NULL,
+    last_used   REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entries_lookup ON entries (tag, filters_key);
+CREATE INDEX IF NOT EXISTS entries_prompt ON entries (tag, prompt_key);
+"""
+
+def normalize_prompt(prompt: str) -> str:
+    return re.sub(r"\s+", " ", prompt.strip().lower()).strip(" ?.!")
+
+def normalize_filters(filters: Dict[str, Any]) -> str:
+    """Only the fields that change the rows; case/whitespace-insensitive."""
+    def norm(v):
+        return re.sub(r"\s+", " ", str(v).strip().lower()) if v not in (None, "") else None
+    try:
+        limit = int(filters.get("limit") or 0) or None
+    except (TypeError, ValueError):
+        limit = None
+    return json.dumps({
+        "airline": norm(filters.get("airline")),
+        "training_type": norm(filters.get("training_type")),
+        "limit": limit,
+    }, sort_keys=True)
+
+def _unit(vector: List[float]) -> np.ndarray:
+    v = np.asarray(vector, dtype=np.float32)
+    n = np.linalg.norm(v)
+    return v / n if n else v
+
+class QueryCache:
+    """
+    Persistent result cache shared by CLI runs. Entries are only visible for
+    the snapshot tag they were computed against, so any re-ingest or watch
+    batch invalidates them; TTL and an LRU entry cap bound the store.
+    """
+
+    def __init__(self, path=QUERY_CACHE_PATH, threshold: float = QUERY_CACHE_THRESHOLD,
+                 ttl: float = QUERY_CACHE_TTL, max_entries: int = QUERY_CACHE_MAX_ENTRIES):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(str(path), timeout=30)
+        self._db.executescript(_SCHEMA)
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+
+    def _touch(self, entry_id: int, rows: str) -> List[Dict[str, Any]]:
+        with self._db:
+            self._db.execute("UPDATE entries SET last_used = ? WHERE id = ?", (time.time(), entry_id))
+        return json.loads(rows)
+
+    def lookup_prompt(self, prompt: str, tag: str) -> Optional[List[Dict[str, Any]]]:
+        """Exact (normalized) repeat of an earlier prompt: no model call at all."""
+        hit = self._db.execute(
+            "SELECT id, rows FROM entries WHERE tag = ? AND prompt_key = ? AND created >= ? "
+            "ORDER BY last_used DESC LIMIT 1",
+            (tag, normalize_prompt(prompt), time.time() - self.ttl),
+        ).fetchone()
+        return self._touch(*hit) if hit else None
+
+    def lookup(self, filters: Dict[str, Any], vector: List[float], tag: str) -> Optional[List[Dict[str, Any]]]:
+        """Same normalized filters and cosine(query, cached query) >= threshold."""
+        found = self._db.execute(
+            "SELECT id, vector FROM entries WHERE tag = ? AND filters_key = ? AND created >= ?",
+            (tag, normalize_filters(filters), time.time() - self.ttl),
+        ).fetchall()
+        if not found:
+            return None
+        q = _unit(vector)
+        mat = np.vstack([np.frombuffer(v, dtype=np.float32) for _, v in found])
+        if mat.shape[1] != q.shape[0]:
+            return None
+        sims = mat @ q
+        best = int(np.argmax(sims))
+        if sims[best] < self.threshold:
+            return None
+        rows = self._db.execute("SELECT rows FROM entries WHERE id = ?", (found[best][0],)).fetchone()[0]
+        return self._touch(found[best][0], rows)
+
+    def store(self, prompt: str, filters: Dict[str, Any], vector: List[float], tag: str,
+              rows: List[Dict[str, Any]]):
+        now = time.time()
+        with self._db:
+            # Entries from older snapshots can never hit again
+            self._db.execute("DELETE FROM entries WHERE tag != ? OR created < ?", (tag, now - self.ttl))
+            self._db.execute(
+                "INSERT INTO entries (tag, filters_key, prompt_key, vector, rows, created, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (tag, normalize_filters(filters), normalize_prompt(prompt), _unit(vector).tobytes(),
+                 json.dumps(rows, ensure_ascii=False), now, now),
+            )
+            self._db.execute(
+                "DELETE FROM entries WHERE id NOT IN (SELECT id FROM entries ORDER BY last_used DESC LIMIT ?)",
+                (max(self.max_entries, 1),),
+            )
+
+    def close(self):
+        self._db.close()
@@ -0,0 +1,119 @@
+import os
+import csv
+import json
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Dict, Any, List, Optional
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from .config import DATA_DIR
+
+OUTPUT_COLUMNS = [
+    "Who", "Role", "Aircraft", "From", "To", "Duration", "Autoland",
+    "airline", "training_type", "document_type", "timestamp", "doc_id",
+    "path", "paths",  # representative source file and every identical copy (';'-joined)
+]
+
+# ---- Row sinks: consume result rows one at a time as extraction completes ----
+class RowSink(ABC):
+    def __init__(self):
+        self.count = 0
+
+    def write(self, row: Dict[str, Any]):
+        self._write([str(row.get(c, "not found")) for c in OUTPUT_COLUMNS])
+        self.count += 1
+
+    @abstractmethod
+    def _write(self, values: List[str]):
+        """Persist one row, already ordered as OUTPUT_COLUMNS."""
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+class ConsoleSink(RowSink):
+    def __init__(self):
+        super().__init__()
+        print(" | ".join(OUTPUT_COLUMNS), flush=True)
+
+    def _write(self, values: List[str]):
+        print(" | ".join(values), flush=True)
+
+class CsvSink(RowSink):
+    def __init__(self, path: Path):
+        super().__init__()
+        self._fh = path.open("w", encoding="utf-8", newline="")
+        self._csv = csv.writer(self._fh)
+        self._csv.writerow(OUTPUT_COLUMNS)
+
+    def _write(self, values: List[str]):
+        self._csv.writerow(values)
+        self._fh.flush()
+
+    def close(self):
+        self._fh.close()
+
+class JsonlSink(RowSink):
+    def __init__(self, path: Path):
+        super().__init__()
+        self._fh = path.open("w", encoding="utf-8")
+
+    def _write(self, values: List[str]):
+        self._fh.write(json.dumps(dict(zip(OUTPUT_COLUMNS, values)), ensure_ascii=False) + "\n")
+        self._fh.flush()
+
+    def close(self):
+        self._fh.close()
+
+class ParquetSink(RowSink):
+    """Buffers up to `batch_rows` rows, then appends them as a row group."""
+    SCHEMA = pa.schema([(c, pa.string()) for c in OUTPUT_COLUMNS])
+
+    def __init__(self, path: Path, batch_rows: int = 256):
+        super().__init__()
+        self._writer = pq.ParquetWriter(str(path), self.SCHEMA)
+        self._batch_rows = batch_rows
+        self._buf: List[List[str]] = []
+
+    def _write(self, values: List[str]):
+        self._buf.append(values)
+        if len(self._buf) >= self._batch_rows:
+            self._flush()
+
+    def _flush(self):
+        if self._buf:
+            cols = list(zip(*self._buf))
+            self._writer.write_table(pa.table(
+                {c: pa.array(v, type=pa.string()) for c, v in zip(OUTPUT_COLUMNS, cols)}, schema=self.SCHEMA))
+            self._buf = []
+
+    def close(self):
+        self._flush()
+        self._writer.close()
+
+def open_sink(out_path: Optional[str]) -> RowSink:
+    """
+    Pick a sink from the output extension (.parquet/.csv/.jsonl); a directory
+    (trailing '/' or no extension) appends to a partitioned dataset; no path
+    prints to console.
+    """
+    if out_path:
+        path = DATA_DIR / out_path
+        if out_path.endswith(("/", os.sep)) or not path.suffix:
+            from .dataset import DatasetSink
+            return DatasetSink(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        if out_path.endswith(".parquet"):
+            return ParquetSink(path)
+        if out_path.endswith(".csv"):
+            return CsvSink(path)
+        if out_path.endswith(".jsonl"):
+            return JsonlSink(path)
+    return ConsoleSink()
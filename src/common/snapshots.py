@@ -0,0 +1,59 @@
+import os
+import time
+import shutil
+from pathlib import Path
+from typing import Optional
+from .config import DATA_DIR, SNAPSHOTS_DIR, CURRENT_PATH, SNAPSHOT_KEEP
+
+INDEX_DIRNAME = "faiss_index"
+MANIFEST_NAME = "manifest.parquet"
+SHARDS_DIRNAME = "shards"   # sharded-ingest scratch space inside a staging snapshot
+
+def current_version() -> Optional[str]:
+    try:
+        return CURRENT_PATH.read_text(encoding="utf-8").strip() or None
+    except FileNotFoundError:
+        return None
+
+def current_dir() -> Path:
+    """Directory holding the live faiss_index/ and manifest.parquet (legacy layout: DATA_DIR itself)."""
+    version = current_version()
+    return SNAPSHOTS_DIR / version if version else DATA_DIR
+
+def index_dir(base: Optional[Path] = None) -> Path:
+    return (base or current_dir()) / INDEX_DIRNAME
+
+def manifest_path(base: Optional[Path] = None) -> Path:
+    return (base or current_dir()) / MANIFEST_NAME
+
+def snapshot_tag(base: Optional[Path] = None) -> str:
+    """Changes whenever ingest/watch publishes (version dir name + index mtime for the legacy layout)."""
+    base = base or current_dir()
+    return f"{base.name}:{(index_dir(base) / 'index.faiss').stat().st_mtime_ns}"
+
+def stage_snapshot() -> Path:
+    """Fresh private directory; readers cannot see it until publish_snapshot()."""
+    staging = SNAPSHOTS_DIR / f".staging-{os.getpid()}-{time.time_ns()}"
+    (staging / INDEX_DIRNAME).mkdir(parents=True)
+    return staging
+
+def publish_snapshot(staging: Path) -> str:
+    """
+    Rename the staged directory to the next version and atomically repoint
+    CURRENT at it. Queries that already resolved an older version keep
+    reading it; only the oldest beyond SNAPSHOT_KEEP are removed.
+    """
+    versions = sorted(p.name for p in SNAPSHOTS_DIR.glob("v*") if p.is_dir())
+    version = f"v{int(versions[-1][1:]) + 1:06d}" if versions else "v000001"
+    staging.rename(SNAPSHOTS_DIR / version)
+
+    tmp = CURRENT_PATH.with_name(CURRENT_PATH.name + ".tmp")
+    tmp.write_text(version, encoding="utf-8")
+    os.replace(tmp, CURRENT_PATH)
+
+    for old in (versions + [version])[:-max(SNAPSHOT_KEEP, 1)]:
+        shutil.rmtree(SNAPSHOTS_DIR / old, ignore_errors=True)
+    return version
+
+def discard_snapshot(staging: Path):
+    shutil.rmtree(staging, ignore_errors=True)
@@ -1,14 +1,290 @@
-from langchain_community.vectorstores import FAISS
-from langchain_openai import OpenAIEmbeddings
-from typing import List, Dict, Any
-from .config import FAISS_DIR, EMBED_MODEL, EMBED_MODEL_API_KEY, BASE_URL
-
-def build_faiss_from_chunks(texts: List[str], metadatas: List[Dict[str, Any]]) -> FAISS:
-    embeddings = OpenAIEmbeddings(model=EMBED_MODEL, api_key=EMBED_MODEL_API_KEY, base_url=BASE_URL)
-    vs = FAISS.from_texts(texts=texts, embedding=embeddings, metadatas=metadatas)
-    vs.save_local(str(FAISS_DIR))
-    return vs
-
-def load_faiss() -> FAISS:
-    embeddings = OpenAIEmbeddings(model=EMBED_MODEL, api_key=EMBED_MODEL_API_KEY, base_url=BASE_URL)
-    return FAISS.load_local(str(FAISS_DIR), embeddings, allow_dangerous_deserialization=True)
+import json
+import faiss
+from pathlib import Path
+import numpy as np
+import pandas as pd
+from langchain_core.embeddings import Embeddings
+from typing import List, Dict, Any, Optional, Iterator, Tuple
+from .config import EMBED_MODEL, DOC_CENTROIDS, DOC_SCORE_AGG, RETRIEVE_OVERSAMPLE
+from .embeddings import get_embeddings, embedding_signature
+from .snapshots import index_dir as current_index_dir
+
+INDEX_FILE = "index.faiss"
+CHUNKS_FILE = "chunks.parquet"          # per-vector metadata, row i == FAISS id i
+CHUNK_TEXT_FILE = "chunk_text.parquet"  # chunk text, same row order; read only when rewriting
+EMBED_INFO_FILE = "embedding.json"
+DOC_INDEX_FILE = "doc_centroids.faiss"
+DOC_META_FILE = "doc_centroids.parquet"
+
+# Dictionary-encoded (pandas categorical / Arrow dictionary) metadata columns
+META_COLUMNS = ["doc_id", "airline", "training_type", "document_type", "timestamp"]
+
+# Indexes saved before provider selection existed were always built with OpenAI.
+_LEGACY_SIGNATURE = {"provider": "openai", "model": EMBED_MODEL, "dim": None}
+
+def _save_embedding_info(out_dir: Path, dim: int):
+    (out_dir / EMBED_INFO_FILE).write_text(json.dumps(embedding_signature(dim)), encoding="utf-8")
+
+def _check_embedding_info(idx_dir: Path, dim: int):
+    info = idx_dir / EMBED_INFO_FILE
+    built = json.loads(info.read_text(encoding="utf-8")) if info.exists() else _LEGACY_SIGNATURE
+    current = embedding_signature(dim)
+    if (built["provider"], built["model"]) != (current["provider"], current["model"]) or current["dim"] != dim:
+        raise ValueError(
+            f"FAISS index at {idx_dir} was built with {built['provider']}/{built['model']} (dim={dim}), "
+            f"but the configured embedding provider is {current['provider']}/{current['model']} "
+            f"(dim={current['dim']}). Re-run ingest or switch EMBED_PROVIDER back."
+        )
+
+def _encode_columns(df: pd.DataFrame) -> pd.DataFrame:
+    df = df.reset_index(drop=True)
+    for c in META_COLUMNS:
+        df[c] = df[c].astype(str).astype("category")
+    df["chunk_id"] = df["chunk_id"].astype(np.int32)
+    return df
+
+def _decoded(df: pd.DataFrame) -> pd.DataFrame:
+    return df.astype({c: str for c in META_COLUMNS})
+
+def _row_dict(df: pd.DataFrame, i: int) -> Dict[str, Any]:
+    md = {c: str(df[c].iat[i]) for c in META_COLUMNS}
+    if "chunk_id" in df:
+        md["chunk_id"] = int(df["chunk_id"].iat[i])
+    return md
+
+def _filter_mask(df: pd.DataFrame, filter: Optional[Dict[str, Any]]) -> Optional[np.ndarray]:
+    """Vectorized equality filter over categorical codes; None means 'no filter'."""
+    if not filter:
+        return None
+    mask = np.ones(len(df), dtype=bool)
+    for k, v in filter.items():
+        cats = df[k].cat.categories
+        if v not in cats:
+            return np.zeros(len(df), dtype=bool)
+        mask &= df[k].cat.codes.to_numpy() == cats.get_loc(v)
+    return mask
+
+# ---- Chunk index: FAISS vectors + columnar metadata ----
+class ChunkIndex:
+    """
+    Flat L2 FAISS index whose per-vector metadata is a columnar frame aligned
+    with vector ids (doc_id and low-cardinality columns dictionary-encoded).
+    Chunk text is kept on disk and only read when the index is rewritten.
+    """
+
+    def __init__(self, index: faiss.Index, meta: pd.DataFrame, embeddings: Embeddings,
+                 texts: Optional[List[str]] = None, text_path: Optional[Path] = None):
+        self.index = index
+        self.meta = meta
+        self.embeddings = embeddings
+        self._texts = texts
+        self._text_path = text_path
+
+    @classmethod
+    def from_texts(cls, texts: List[str], metadatas: List[Dict[str, Any]], embeddings: Embeddings) -> "ChunkIndex":
+        vecs = np.array(embeddings.embed_documents(texts), dtype=np.float32)
+        index = faiss.IndexFlatL2(vecs.shape[1])
+        index.add(vecs)
+        return cls(index, _encode_columns(pd.DataFrame(metadatas)), embeddings, texts=list(texts))
+
+    @classmethod
+    def load(cls, idx_dir: Path, embeddings: Embeddings) -> "ChunkIndex":
+        if not (idx_dir / CHUNKS_FILE).exists() and (idx_dir / "index.pkl").exists():
+            return cls._from_langchain(idx_dir, embeddings)
+        index = faiss.read_index(str(idx_dir / INDEX_FILE))
+        meta = pd.read_parquet(idx_dir / CHUNKS_FILE)
+        return cls(index, meta, embeddings, text_path=idx_dir / CHUNK_TEXT_FILE)
+
+    @classmethod
+    def _from_langchain(cls, idx_dir: Path, embeddings: Embeddings) -> "ChunkIndex":
+        # Indexes written before the columnar layout: LangChain FAISS with a pickled docstore
+        from langchain_community.vectorstores import FAISS
+        vs = FAISS.load_local(str(idx_dir), embeddings, allow_dangerous_deserialization=True)
+        docs = [vs.docstore.search(vs.index_to_docstore_id[i]) for i in range(vs.index.ntotal)]
+        return cls(vs.index, _encode_columns(pd.DataFrame([d.metadata for d in docs])), embeddings,
+                   texts=[d.page_content for d in docs])
+
+    def texts(self) -> List[str]:
+        if self._texts is None:
+            self._texts = pd.read_parquet(self._text_path)["text"].tolist()
+        return self._texts
+
+    def row(self, i: int) -> Dict[str, Any]:
+        return _row_dict(self.meta, i)
+
+    def add(self, texts: List[str], metadatas: List[Dict[str, Any]]):
+        if not texts:
+            return
+        all_texts = self.texts() + list(texts)
+        self.index.add(np.array(self.embeddings.embed_documents(texts), dtype=np.float32))
+        self.meta = _encode_columns(pd.concat([_decoded(self.meta), pd.DataFrame(metadatas)], ignore_index=True))
+        self._texts = all_texts
+
+    def merge_from(self, other: "ChunkIndex"):
+        all_texts = self.texts() + other.texts()
+        self.index.merge_from(other.index, 0)
+        self.meta = _encode_columns(pd.concat([_decoded(self.meta), _decoded(other.meta)], ignore_index=True))
+        self._texts = all_texts
+
+    def delete_docs(self, doc_ids: List[str]):
+        drop = self.meta["doc_id"].isin(doc_ids).to_numpy()
+        if not drop.any():
+            return
+        texts = self.texts()
+        # IndexFlat.remove_ids compacts ids in order, so metadata rows stay aligned
+        self.index.remove_ids(np.flatnonzero(drop).astype(np.int64))
+        self.meta = self.meta[~drop].reset_index(drop=True)
+        for c in META_COLUMNS:
+            self.meta[c] = self.meta[c].cat.remove_unused_categories()
+        self._texts = [t for t, d in zip(texts, drop) if not d]
+
+    def save(self, out_dir: Path):
+        out_dir.mkdir(parents=True, exist_ok=True)
+        faiss.write_index(self.index, str(out_dir / INDEX_FILE))
+        self.meta.to_parquet(out_dir / CHUNKS_FILE, index=False)
+        pd.DataFrame({"text": self.texts()}).to_parquet(out_dir / CHUNK_TEXT_FILE, index=False)
+
+def build_doc_centroids(store: ChunkIndex, out_dir: Path):
+    """Mean chunk vector per doc_id, saved as a small flat index for first-pass search."""
+    vecs = store.index.reconstruct_n(0, store.index.ntotal)
+    codes = store.meta["doc_id"].cat.codes.to_numpy()
+    uniq, first, inv = np.unique(codes, return_index=True, return_inverse=True)
+    sums = np.zeros((len(uniq), store.index.d), dtype=np.float64)
+    np.add.at(sums, inv, vecs)
+    index = faiss.IndexFlatL2(store.index.d)
+    if len(uniq):
+        index.add((sums / np.bincount(inv)[:, None]).astype(np.float32))
+    faiss.write_index(index, str(out_dir / DOC_INDEX_FILE))
+    store.meta.iloc[first][META_COLUMNS].reset_index(drop=True).to_parquet(out_dir / DOC_META_FILE, index=False)
+
+def _save(store: ChunkIndex, out_dir: Path):
+    store.save(out_dir)
+    _save_embedding_info(out_dir, store.index.d)
+    if DOC_CENTROIDS:
+        build_doc_centroids(store, out_dir)
+
+def build_faiss_from_chunks(texts: List[str], metadatas: List[Dict[str, Any]], out_dir: Path) -> ChunkIndex:
+    store = ChunkIndex.from_texts(texts, metadatas, get_embeddings())
+    _save(store, out_dir)
+    return store
+
+def build_faiss_shard(texts: List[str], metadatas: List[Dict[str, Any]], shard_dir: Path):
+    """Build one shard index in a worker process; single-threaded embedding to avoid oversubscription."""
+    ChunkIndex.from_texts(texts, metadatas, get_embeddings(workers=1)).save(shard_dir)
+
+def merge_faiss_shards(shard_dirs: List[Path], out_dir: Path) -> ChunkIndex:
+    """Merge shard indexes (in order) into one index; vector ids are renumbered contiguously."""
+    emb = get_embeddings()
+    store = ChunkIndex.load(shard_dirs[0], emb)
+    for d in shard_dirs[1:]:
+        store.merge_from(ChunkIndex.load(d, emb))
+    _save(store, out_dir)
+    return store
+
+def update_faiss(src_dir: Path, out_dir: Path, texts: List[str], metadatas: List[Dict[str, Any]],
+                 drop_doc_ids: List[str]) -> ChunkIndex:
+    """
+    Copy-on-write update for watch mode: drop every chunk of `drop_doc_ids`,
+    append the new chunks (only these are embedded) and save to `out_dir`.
+    `src_dir` is left untouched for readers still on that snapshot.
+    """
+    store = ChunkIndex.load(src_dir, get_embeddings())
+    _check_embedding_info(src_dir, store.index.d)
+    store.delete_docs(drop_doc_ids)
+    store.add(texts, metadatas)
+    _save(store, out_dir)
+    return store
+
+_loaded: Dict[str, Any] = {}
+
+def load_faiss(idx_dir: Optional[Path] = None) -> ChunkIndex:
+    """Load once per process; reloaded when the live snapshot (or the saved index) changes."""
+    idx_dir = idx_dir or current_index_dir()
+    key = (str(idx_dir), (idx_dir / INDEX_FILE).stat().st_mtime_ns)
+    if _loaded.get("key") != key:
+        store = ChunkIndex.load(idx_dir, get_embeddings())
+        _check_embedding_info(idx_dir, store.index.d)
+        _loaded.update(key=key, store=store, centroids=None)
+    return _loaded["store"]
+
+def load_doc_centroids(idx_dir: Optional[Path] = None) -> Optional[Tuple[faiss.Index, pd.DataFrame]]:
+    """Centroid index + per-row doc metadata, or None when DOC_CENTROIDS is off or the index has none."""
+    idx_dir = idx_dir or current_index_dir()
+    path = idx_dir / DOC_INDEX_FILE
+    if not DOC_CENTROIDS or not path.exists():
+        return None
+    load_faiss(idx_dir)
+    if _loaded.get("centroids") is None:
+        _loaded["centroids"] = (faiss.read_index(str(path)), pd.read_parquet(idx_dir / DOC_META_FILE))
+    return _loaded["centroids"]
+
+# ---- Document-level search ----
+def _iter_centroids(centroids: Tuple[faiss.Index, pd.DataFrame], vec: np.ndarray, n: int,
+                    filter: Optional[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+    index, metas = centroids
+    total = index.ntotal
+    allowed = _filter_mask(metas, filter)
+    if total == 0 or (allowed is not None and not allowed.any()):
+        return
+    k, seen = min(n, total), 0
+    while True:
+        _, ids = index.search(vec, k)
+        hits = ids[0][ids[0] >= 0]
+        if allowed is not None:
+            hits = hits[allowed[hits]]
+        for i in hits[seen:n]:
+            yield _row_dict(metas, int(i))
+        seen = len(hits)
+        if seen >= n or k >= total:
+            return
+        k = min(k * 2, total)
+
+def iter_documents(store: ChunkIndex, vec: np.ndarray, n: int, filter: Optional[Dict[str, Any]] = None,
+                   agg: str = DOC_SCORE_AGG, centroids=None) -> Iterator[Dict[str, Any]]:
+    """
+    Yield metadata for the top-n unique documents matching `filter`, ranked by
+    aggregated chunk similarity (max or sum). Chunk fetch depth doubles until
+    n unique documents are found or the index is exhausted. With max
+    aggregation a document's rank is final when first seen, so it is yielded
+    immediately; sum aggregation yields once the search settles. When
+    `centroids` (see load_doc_centroids) is given it is searched instead.
+    Filtering and de-duplication run over the categorical codes.
+    """
+    if centroids is not None:
+        yield from _iter_centroids(centroids, vec, n, filter)
+        return
+
+    total = store.index.ntotal
+    allowed = _filter_mask(store.meta, filter)
+    if total == 0 or (allowed is not None and not allowed.any()):
+        return
+    doc_codes = store.meta["doc_id"].cat.codes.to_numpy()
+    k = min(n * max(RETRIEVE_OVERSAMPLE, 1), total)
+    yielded = 0
+    while True:
+        dists, ids = store.index.search(vec, k)
+        valid = ids[0] >= 0
+        d, i = dists[0][valid], ids[0][valid]
+        if allowed is not None:
+            keep = allowed[i]
+            d, i = d[keep], i[keep]
+        uniq, first, inv = np.unique(doc_codes[i], return_index=True, return_inverse=True)
+        if agg != "sum":
+            # Rank order == order of each document's best (first) chunk
+            ranked = np.sort(first)
+            for j in ranked[yielded:n]:
+                yield store.row(int(i[j]))
+            yielded = min(len(ranked), n)
+        if len(uniq) >= n or k >= total:
+            break
+        k = min(k * 2, total)
+    if agg == "sum":
+        scores = np.zeros(len(uniq))
+        np.add.at(scores, inv, 1.0 / (1.0 + d))
+        for u in np.argsort(-scores, kind="stable")[:n]:
+            yield store.row(int(i[first[u]]))
+
+def search_documents(store: ChunkIndex, query: str, n: int, filter: Optional[Dict[str, Any]] = None,
+                     agg: str = DOC_SCORE_AGG, centroids=None) -> List[Dict[str, Any]]:
+    vec = np.array([store.embeddings.embed_query(query)], dtype=np.float32)
+    return list(iter_documents(store, vec, n, filter, agg, centroids))
@@ -1,28 +1,46 @@
-from typing import TypedDict, List, Dict, Any
+from pathlib import Path
+from typing import TypedDict, List, Dict, Any, Optional, Iterator
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
 import pandas as pd
 
 from langgraph.graph import StateGraph, START, END
-from langchain_openai import ChatOpenAI
+from langgraph.config import get_stream_writer
 from langchain_core.messages import HumanMessage, SystemMessage
 from langchain.tools.render import render_text_description
 
-from src.common.config import CHAT_MODEL, TOP_K, OPENAI_API_KEY, BASE_URL
-from src.common.vectors import load_faiss
-from src.common.io import load_manifest
+from src.common.config import TOP_K, EXTRACT_CONCURRENCY, QUERY_CACHE
+from src.common.clients import get_chat_model
+from src.common.vectors import load_faiss, load_doc_centroids, iter_documents
+from src.common.snapshots import current_dir, index_dir, manifest_path, snapshot_tag
+from src.common.query_cache import QueryCache
+from src.common.io import load_manifest, source_paths
 from src.common.tools import PARSE_FILTERS, EXTRACT_FIELDS
 
 # ---- Graph state ----
 class AppState(TypedDict):
     prompt: str
     filters: Dict[str, Any]
+    query_vector: List[float]
+    snapshot: str   # index/manifest snapshot resolved once so every node reads the same version
+    cache_tag: str  # query-cache key for that snapshot
+    cached: bool    # rows were served from the query cache; extraction is skipped
     candidates: List[Dict[str, Any]]
     rows: List[Dict[str, Any]]
     export_path: str
+    stream: bool    # rows are emitted on the custom stream only, not accumulated in state
+
+def _limit(filters: Dict[str, Any]) -> Optional[int]:
+    try:
+        n = int((filters or {}).get("limit") or 0)
+    except (TypeError, ValueError):
+        return None
+    return n if n > 0 else None
 
 # ---- Nodes ----
-def parse_filters_node(state: AppState) -> AppState:
-    llm = ChatOpenAI(model=CHAT_MODEL, api_key=OPENAI_API_KEY, base_url=BASE_URL, temperature=0)
-    llm = llm.bind_tools([PARSE_FILTERS])
+def parse_filters_node(state: AppState) -> Dict[str, Any]:
+    llm = get_chat_model().bind_tools([PARSE_FILTERS])
 
     system = SystemMessage(content=(
         "You parse the user's request into structured filters by calling the 'parse_filters' tool."
@@ -38,95 +56,134 @@ def parse_filters_node(state: AppState) -> AppState:
         if tc["name"] == "parse_filters":
             filt = {**filt, **tc["args"]}
             break
-    state["filters"] = filt
-    return state
+    return {"filters": filt}
+
+def embed_query_node(state: AppState) -> Dict[str, Any]:
+    # Independent of the parsed filters: runs in parallel with parse_filters
+    snapshot = current_dir()
+    store = load_faiss(index_dir(snapshot))
+    return {"query_vector": store.embeddings.embed_query(state["prompt"]), "snapshot": str(snapshot),
+            "cache_tag": snapshot_tag(snapshot)}
+
+def lookup_cache_node(state: AppState) -> Dict[str, Any]:
+    # Paraphrases with the same filters and a near-identical embedding reuse earlier rows
+    if not QUERY_CACHE:
+        return {"cached": False}
+    cache = QueryCache()
+    try:
+        rows = cache.lookup(state["filters"], state["query_vector"], state["cache_tag"])
+    finally:
+        cache.close()
+    if rows is None:
+        return {"cached": False}
+    writer = get_stream_writer()
+    for row in rows:
+        writer({"row": row})
+    print(f"Served {len(rows)} rows from the query cache")
+    return {"cached": True, "rows": [] if state.get("stream") else rows}
 
-def retrieve_node(state: AppState) -> AppState:
-    vs = load_faiss()
+def _iter_candidates(state: AppState) -> Iterator[Dict[str, Any]]:
+    idx_dir = index_dir(Path(state["snapshot"]))
+    store = load_faiss(idx_dir)
     # Post-filter by airline/training_type if provided
     airline = (state["filters"] or {}).get("airline")
     training = (state["filters"] or {}).get("training_type")
-    
-    search_kwargs={"k": TOP_K}
-    if airline or training:
-        _filter = {}
-        if airline:
-            _filter["airline"] = airline
-        if training:
-            _filter["training_type"] = training
-        search_kwargs["filter"] = _filter
-    
-    retriever = vs.as_retriever(search_kwargs=search_kwargs)
-    docs = retriever.invoke(state["prompt"])
-
-    # Keep unique doc_ids
-    seen = set()
-    candidates = []
-    for d in docs:
-        md = d.metadata or {}
-        did = md.get("doc_id")
-        if not did or did in seen:
-            continue
-        seen.add(did)
-        candidates.append(md)
-    
-    print(f"Found {len(candidates)} candidates after retrieval")
-    state["candidates"] = candidates
-    return state
-
-def extract_node(state: AppState) -> AppState:
-    # Load manifest to get raw_json per doc_id
-    manifest = load_manifest().set_index("doc_id")
-    llm = ChatOpenAI(model=CHAT_MODEL, api_key=OPENAI_API_KEY, base_url=BASE_URL, temperature=0)
-    llm = llm.bind_tools([EXTRACT_FIELDS])
-
-    rows = []
-    for md in state["candidates"]:
-        doc_id = md["doc_id"]
-        raw_json = manifest.loc[doc_id]["raw_json"]
-
-        system = SystemMessage(content=(
-            "You extract seven fields from an arbitrary JSON document by calling the 'extract_fields' tool. "
-            "If any field is missing or ambiguous, set its value to 'not found'. "
-            "Requested keys: Who, Role, Aircraft, From, To, Duration, Autoland."
-        ))
-        user = HumanMessage(content=f"JSON:\n```json\n{raw_json}\n```")
-        resp = llm.invoke([system, user])
-
-        tool_calls = getattr(resp, "tool_calls", []) or []
-        extracted = {
-            "Who":"not found","Role":"not found","Aircraft":"not found",
-            "From":"not found","To":"not found","Duration":"not found","Autoland":"not found"
-        }
-        for tc in tool_calls:
-            if tc["name"] == "extract_fields":
-                args = tc["args"] or {}
-                # normalize alias From_
-                if "From_" in args and "From" not in args:
-                    args["From"] = args.pop("From_")
-                extracted.update(args)
+
+    _filter = {}
+    if airline:
+        _filter["airline"] = airline
+    if training:
+        _filter["training_type"] = training
+
+    # Doc-level retrieval: exactly `limit` (or TOP_K) unique documents when available
+    n = _limit(state["filters"]) or TOP_K
+    vec = np.array([state["query_vector"]], dtype=np.float32)
+    return iter_documents(store, vec, n, filter=_filter or None, centroids=load_doc_centroids(idx_dir))
+
+def _extract_one(llm, raw_json: str, md: Dict[str, Any], paths: List[str]) -> Dict[str, Any]:
+    system = SystemMessage(content=(
+        "You extract seven fields from an arbitrary JSON document by calling the 'extract_fields' tool. "
+        "If any field is missing or ambiguous, set its value to 'not found'. "
+        "Requested keys: Who, Role, Aircraft, From, To, Duration, Autoland."
+    ))
+    user = HumanMessage(content=f"JSON:\n```json\n{raw_json}\n```")
+    resp = llm.invoke([system, user])
+
+    tool_calls = getattr(resp, "tool_calls", []) or []
+    extracted = {
+        "Who":"not found","Role":"not found","Aircraft":"not found",
+        "From":"not found","To":"not found","Duration":"not found","Autoland":"not found"
+    }
+    for tc in tool_calls:
+        if tc["name"] == "extract_fields":
+            args = tc["args"] or {}
+            # normalize alias From_
+            if "From_" in args and "From" not in args:
+                args["From"] = args.pop("From_")
+            extracted.update(args)
+            break
+
+    return {
+        **extracted,
+        "airline": md.get("airline","not found"),
+        "training_type": md.get("training_type","not found"),
+        "document_type": md.get("document_type","not found"),
+        "timestamp": md.get("timestamp","not found"),
+        "doc_id": md["doc_id"],
+        "path": paths[0],
+        "paths": ";".join(paths),
+    }
+
+def extract_node(state: AppState) -> Dict[str, Any]:
+    """
+    Retrieval and extraction overlap: candidates are pulled from the doc-level
+    retriever one at a time and dispatched to a thread pool immediately, so the
+    first extractions run while later candidates are still being resolved.
+    Rows are emitted in retrieval rank order, each as soon as it and every
+    higher-ranked row are done.
+    """
+    # Load manifest to get raw_json and source paths per doc_id
+    manifest = load_manifest(manifest_path(Path(state["snapshot"])))
+    manifest = manifest.assign(paths=source_paths(manifest)).set_index("doc_id")
+    llm = get_chat_model().bind_tools([EXTRACT_FIELDS])
+    writer = get_stream_writer()
+    limit = _limit(state["filters"])
+
+    rows, candidates = [], []
+    def emit(fut):
+        row = fut.result()
+        writer({"row": row})
+        if not state.get("stream"):
+            rows.append(row)
+
+    with ThreadPoolExecutor(max_workers=max(EXTRACT_CONCURRENCY, 1)) as ex:
+        pending = deque()   # FIFO in rank order
+        for md in _iter_candidates(state):
+            if limit and len(candidates) >= limit:
                 break
+            candidates.append(md)
+            record = manifest.loc[md["doc_id"]]
+            pending.append(ex.submit(_extract_one, llm, record["raw_json"], md, record["paths"]))
+            while pending and pending[0].done():
+                emit(pending.popleft())
+        while pending:
+            emit(pending.popleft())
 
-        rows.append({
-            **extracted,
-            "airline": md.get("airline","not found"),
-            "training_type": md.get("training_type","not found"),
-            "document_type": md.get("document_type","not found"),
-            "timestamp": md.get("timestamp","not found"),
-            "doc_id": doc_id
-        })
-    state["rows"] = rows
-    return state
+    print(f"Extracted {len(candidates)} candidates after retrieval")
+    return {"candidates": candidates, "rows": rows}
 
 # ---- Build graph ----
 def build_graph():
     graph = StateGraph(AppState)
     graph.add_node("parse_filters", parse_filters_node)
-    graph.add_node("retrieve", retrieve_node)
+    graph.add_node("embed_query", embed_query_node)
+    graph.add_node("lookup_cache", lookup_cache_node)
     graph.add_node("extract", extract_node)
 
+    # parse_filters and embed_query run as parallel branches; the cache lookup waits for both
     graph.add_edge(START, "parse_filters")
-    graph.add_edge("parse_filters", "retrieve")
-    graph.add_edge("retrieve", "extract")
+    graph.add_edge(START, "embed_query")
+    graph.add_edge(["parse_filters", "embed_query"], "lookup_cache")
+    graph.add_conditional_edges("lookup_cache", lambda s: END if s.get("cached") else "extract")
     graph.add_edge("extract", END)
     return graph.compile()
@@ -1,25 +1,36 @@
 import glob
+import shutil
 from pathlib import Path
 from datetime import datetime
-from typing import List, Dict, Any
+from functools import partial
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Dict, Any, Optional, Tuple
 
-from src.common.config import DATA_DIR, FAISS_DIR
-from src.common.io import ensure_dirs, read_json_text, parse_json, safe_meta, save_manifest
-from src.common.digest import digest_for_embedding
-from src.common.vectors import build_faiss_from_chunks
+import pandas as pd
 
-def ingest(folders: List[str]):
-    ensure_dirs()
-    texts, metadatas, manifest_rows = [], [], []
+from src.common.config import DATA_DIR, SNAPSHOTS_DIR, INGEST_WORKERS
+from src.common.io import ensure_dirs, read_json_text, parse_json, safe_meta, save_manifest, load_manifest
+from src.common.digest import digest_for_embedding, content_hash
+from src.common.vectors import build_faiss_from_chunks, build_faiss_shard, merge_faiss_shards
+from src.common.clients import share_budgets
+from src.common.snapshots import (
+    stage_snapshot, publish_snapshot, discard_snapshot, index_dir, manifest_path, SHARDS_DIRNAME,
+)
 
-    files: List[Path] = []
-    for folder in folders:
-        files.extend(Path(folder).glob("*.json"))
-    if not files:
-        print("No JSON files found.")
-        return
+# A group is one unique record: (content hash, every source path carrying it)
+Group = Tuple[str, List[Path]]
 
+def _group_by_content(files: List[Path]) -> List[Group]:
+    """Collapse byte-different but JSON-identical files (canonical digest) into one group each."""
+    groups: Dict[str, List[Path]] = {}
     for fp in sorted(files):
+        groups.setdefault(content_hash(parse_json(read_json_text(fp))), []).append(fp)
+    return list(groups.items())
+
+def _digest_groups(groups: List[Group]) -> Tuple[List[str], List[Dict[str, Any]], List[Dict[str, Any]]]:
+    texts, metadatas, manifest_rows = [], [], []
+    for doc_hash, paths in groups:
+        fp = paths[0]   # representative copy: embedded and extracted once
         raw_text = read_json_text(fp)
         doc = parse_json(raw_text)
 
@@ -34,7 +45,7 @@ def ingest(folders: List[str]):
         for i, ch in enumerate(chunks):
             texts.append(ch)
             metadatas.append({
-                "doc_id": str(fp),
+                "doc_id": doc_hash,
                 "chunk_id": i,
                 "airline": airline,
                 "training_type": training_type,
@@ -43,17 +54,74 @@ def ingest(folders: List[str]):
             })
 
         manifest_rows.append({
-            "doc_id": str(fp),
+            "doc_id": doc_hash,
             "path": str(fp),
+            "paths": [str(p) for p in paths],   # all aliases of this content
             "airline": airline,
             "training_type": training_type,
             "document_type": document_type,
             "timestamp": timestamp,
             "raw_json": raw_text,   # keep original text verbatim
         })
+    return texts, metadatas, manifest_rows
+
+# ---- Sharded ingest (INGEST_WORKERS > 1) ----
+def _ingest_shard(shards_root: Path, shard_id: int, groups: List[Group]) -> Tuple[Optional[Path], int]:
+    """Worker: digest + embed one subset of unique records into its own shard index and shard manifest."""
+    texts, metadatas, manifest_rows = _digest_groups(groups)
+    if not texts:
+        return None, 0
+    shard_dir = shards_root / f"shard_{shard_id:03d}"
+    shard_dir.mkdir(parents=True, exist_ok=True)
+    build_faiss_shard(texts, metadatas, shard_dir)
+    save_manifest(manifest_rows, shard_dir / "manifest.parquet")
+    return shard_dir, len(texts)
+
+def _ingest_sharded(groups: List[Group], workers: int, staging: Path) -> int:
+    # Shards live inside this ingest's private staging snapshot: concurrent
+    # ingests never share them, and a failed ingest discards them with it
+    shards_root = staging / SHARDS_DIRNAME
+    # De-duplicated before sharding, so copies never land in different shards;
+    # round-robin over sorted groups keeps shard sizes balanced
+    shards = [groups[i::workers] for i in range(workers)]
+    # Shard processes split the model concurrency/rate budgets instead of each taking all of them
+    with ProcessPoolExecutor(max_workers=workers, initializer=share_budgets, initargs=(workers,)) as ex:
+        results = list(ex.map(partial(_ingest_shard, shards_root), range(workers), shards))
+    shard_dirs = [d for d, _ in results if d is not None]
+    if not shard_dirs:
+        return 0
+
+    merge_faiss_shards(shard_dirs, index_dir(staging))
+    manifest = pd.concat([load_manifest(d / "manifest.parquet") for d in shard_dirs], ignore_index=True)
+    save_manifest(manifest, manifest_path(staging))
+    shutil.rmtree(shards_root, ignore_errors=True)
+    return sum(n for _, n in results)
+
+def ingest(folders: List[str], workers: int = INGEST_WORKERS):
+    ensure_dirs()
+
+    files: List[Path] = []
+    for folder in folders:
+        files.extend(Path(folder).glob("*.json"))
+    if not files:
+        print("No JSON files found.")
+        return
+    groups = _group_by_content(files)
 
-    # Build & save FAISS
-    vs = build_faiss_from_chunks(texts, metadatas)
-    save_manifest(manifest_rows)
+    workers = max(1, min(workers, len(groups)))
+    staging = stage_snapshot()
+    try:
+        if workers > 1:
+            n_chunks = _ingest_sharded(groups, workers, staging)
+        else:
+            texts, metadatas, manifest_rows = _digest_groups(groups)
+            # Build & save FAISS
+            vs = build_faiss_from_chunks(texts, metadatas, index_dir(staging))
+            save_manifest(manifest_rows, manifest_path(staging))
+            n_chunks = len(texts)
+        version = publish_snapshot(staging)
+    except BaseException:
+        discard_snapshot(staging)
+        raise
 
-    print(f"✅ Ingested {len(files)} files; stored {len(texts)} chunks into {FAISS_DIR}")
+    print(f"✅ Ingested {len(files)} files ({len(groups)} unique); stored {n_chunks} chunks into {SNAPSHOTS_DIR / version}")
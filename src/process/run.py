@@ -1,23 +1,57 @@
-import pandas as pd
 from typing import Optional
 from src.process.graph import build_graph
-from src.common.io import load_manifest
-from src.common.config import DATA_DIR
+from src.common.sinks import open_sink, ConsoleSink
+from src.common.config import QUERY_CACHE, QUERY_CACHE_MAX_ROWS
+from src.common.query_cache import QueryCache
+from src.common.snapshots import snapshot_tag
+
+def _cached_prompt(prompt: str):
+    # Exact repeat against the live snapshot: no filter-parse or extraction calls
+    try:
+        tag = snapshot_tag()
+    except FileNotFoundError:
+        return None
+    cache = QueryCache()
+    try:
+        return cache.lookup_prompt(prompt, tag)
+    finally:
+        cache.close()
+
+def _store(prompt: str, final: dict, rows: list):
+    cache = QueryCache()
+    try:
+        cache.store(prompt, final["filters"], final["query_vector"], final["cache_tag"], rows)
+    finally:
+        cache.close()
 
 def run_query(prompt: str, out_path: Optional[str] = None):
-    graph = build_graph()
-    state = {"prompt": prompt, "filters": {}, "candidates": [], "rows": [], "export_path": out_path or ""}
-    result = graph.invoke(state)
-    rows = result["rows"]
-    df = pd.DataFrame(rows, columns=[
-        "Who","Role","Aircraft","From","To","Duration","Autoland",
-        "airline","training_type","document_type","timestamp","doc_id"
-    ])
-    if out_path and out_path.endswith(".parquet"):
-        df.to_parquet(DATA_DIR / out_path, index=False)
-        print(f"Exported {len(df)} rows to {out_path}")
-    else:
-        print(df.to_string(index=False))
+    """
+    Stream rows to the console or an incremental .parquet/.csv/.jsonl writer
+    as each document is extracted. Results are cached per index snapshot
+    (see src/common/query_cache.py) when QUERY_CACHE is enabled.
+    """
+    hit = _cached_prompt(prompt) if QUERY_CACHE else None
+    with open_sink(out_path) as sink:
+        if hit is not None:
+            print(f"Served {len(hit)} rows from the query cache")
+            for row in hit:
+                sink.write(row)
+        else:
+            graph = build_graph()
+            state = {"prompt": prompt, "filters": {}, "candidates": [], "rows": [], "export_path": out_path or "",
+                     "stream": True}
+            final, rows = {}, []
+            for mode, chunk in graph.stream(state, stream_mode=["custom", "values"]):
+                if mode == "values":
+                    final = chunk
+                    continue
+                sink.write(chunk["row"])
+                if len(rows) <= QUERY_CACHE_MAX_ROWS:
+                    rows.append(chunk["row"])
+            if QUERY_CACHE and not final.get("cached") and len(rows) <= QUERY_CACHE_MAX_ROWS:
+                _store(prompt, final, rows)
+    if not isinstance(sink, ConsoleSink):
+        print(f"Exported {sink.count} rows to {out_path}")
 
 def export_direct(airline: str, training_type: str, out_path: str):
     """
@@ -26,5 +60,3 @@ def export_direct(airline: str, training_type: str, out_path: str):
     """
     prompt = f"Return all pilot training records for airline '{airline}' and training type '{training_type}'. Export parquet."
     run_query(prompt, out_path)
-
-
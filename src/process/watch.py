@@ -0,0 +1,146 @@
+import time
+from pathlib import Path
+from typing import List, Dict, Tuple, Set, Optional
+
+import numpy as np
+import pandas as pd
+
+from src.common.config import WATCH_INTERVAL, WATCH_DEBOUNCE
+from src.common.io import ensure_dirs, read_json_text, parse_json, save_manifest, load_manifest, source_paths
+from src.common.digest import content_hash
+from src.common.vectors import build_faiss_from_chunks, update_faiss
+from src.common.snapshots import (
+    current_dir, stage_snapshot, publish_snapshot, discard_snapshot, index_dir, manifest_path,
+)
+from src.process.ingest import _group_by_content, _digest_groups
+
+def _scan(folders: List[str]) -> Dict[str, Tuple[int, int]]:
+    out = {}
+    for folder in folders:
+        for fp in Path(folder).glob("*.json"):
+            try:
+                st = fp.stat()
+            except FileNotFoundError:
+                continue
+            out[str(fp)] = (st.st_mtime_ns, st.st_size)
+    return out
+
+def _readable(path: str) -> bool:
+    # A file still being written usually fails to parse; it is picked up again on its next change
+    try:
+        parse_json(read_json_text(Path(path)))
+        return True
+    except (OSError, ValueError):
+        return False
+
+def _reconcile(folders: List[str], seen: Dict[str, Tuple[int, int]]) -> Tuple[Set[str], Set[str]]:
+    """
+    Diff the live manifest against the folders as they are now: new files and
+    files whose content hash no longer matches their record are changed;
+    indexed files under a watched folder that no longer exist are removed.
+    """
+    try:
+        manifest = load_manifest()
+    except FileNotFoundError:
+        return set(seen), set()
+    hash_of = {p: h for h, ps in zip(manifest["doc_id"], source_paths(manifest)) for p in ps}
+    watched = {Path(f).resolve() for f in folders}
+    removed = {p for p in hash_of.keys() - seen.keys()
+               if Path(p).parent.resolve() in watched and not Path(p).exists()}
+    changed = set()
+    for p in seen:
+        try:
+            stale = hash_of.get(p) != content_hash(parse_json(read_json_text(Path(p))))
+        except (OSError, ValueError):
+            stale = True   # left to _readable: retried once it parses
+        if stale:
+            changed.add(p)
+    return changed, removed
+
+def apply_batch(changed: List[str], removed: List[str]) -> Optional[str]:
+    """
+    Publish a new snapshot from the live one: affected paths are detached from
+    their records, changed files are re-attached by content hash (a known hash
+    only gains an alias), records left without any path are dropped, and only
+    genuinely new content is digested and embedded. Returns None when there
+    is no index yet and nothing new to build one from.
+    """
+    base = current_dir()
+    has_index = (index_dir(base) / "index.faiss").exists()
+    manifest = load_manifest(manifest_path(base)) if has_index else pd.DataFrame(columns=["doc_id", "path", "paths"])
+
+    affected = set(changed) | set(removed)
+    paths = [[p for p in ps if p not in affected] for ps in source_paths(manifest)]
+    row_of = {h: i for i, h in enumerate(manifest["doc_id"])}
+    new_groups = []
+    for doc_hash, fps in _group_by_content([Path(p) for p in changed]):
+        if doc_hash in row_of:
+            paths[row_of[doc_hash]] = sorted(paths[row_of[doc_hash]] + [str(p) for p in fps])
+        else:
+            new_groups.append((doc_hash, fps))
+
+    keep = np.array([bool(ps) for ps in paths], dtype=bool)
+    drop = list(manifest["doc_id"][~keep])
+    manifest = manifest.assign(paths=paths).loc[keep].copy()
+    manifest["path"] = manifest["paths"].map(lambda ps: ps[0])
+    texts, metadatas, manifest_rows = _digest_groups(new_groups)
+    if not has_index and not texts:
+        return None
+
+    staging = stage_snapshot()
+    try:
+        if has_index:
+            update_faiss(index_dir(base), index_dir(staging), texts, metadatas, drop)
+        else:
+            build_faiss_from_chunks(texts, metadatas, index_dir(staging))
+        manifest = pd.concat([manifest, pd.DataFrame(manifest_rows)], ignore_index=True)
+        save_manifest(manifest, manifest_path(staging))
+        return publish_snapshot(staging)
+    except BaseException:
+        discard_snapshot(staging)
+        raise
+
+def watch(folders: List[str], interval: float = WATCH_INTERVAL, debounce: float = WATCH_DEBOUNCE):
+    """
+    Poll `folders` for new, modified and deleted .json files and fold them into
+    the live index as debounced micro-batches. On start, changes made while
+    watch was not running (new, edited and deleted files) are queued as the
+    first batch. A failed batch stays pending and is retried after the next
+    debounce.
+    """
+    ensure_dirs()
+    seen = _scan(folders)
+    changed, removed = _reconcile(folders, seen)
+    last_change = time.monotonic()
+    print(f"👀 Watching {', '.join(folders)} (poll {interval}s, debounce {debounce}s); {len(changed)} changed, {len(removed)} removed pending")
+
+    while True:
+        if (changed or removed) and time.monotonic() - last_change >= debounce:
+            ready = [p for p in changed if _readable(p)]
+            for p in changed.difference(ready):
+                print(f"⚠️  Skipping unreadable {p} until it changes again")
+            try:
+                if ready or removed:
+                    version = apply_batch(ready, list(removed))
+                    if version:
+                        print(f"✅ {version}: {len(ready)} added/updated, {len(removed)} removed")
+            except Exception as e:
+                # Transient embedding/HTTP errors or files vanishing mid-batch: keep the batch pending
+                print(f"⚠️  Batch failed ({type(e).__name__}: {e}); retrying after {debounce}s")
+                last_change = time.monotonic()
+            else:
+                changed.clear()
+                removed.clear()
+
+        time.sleep(interval)
+        current = _scan(folders)
+        for p, stamp in current.items():
+            if seen.get(p) != stamp:
+                changed.add(p)
+                removed.discard(p)
+                last_change = time.monotonic()
+        for p in seen.keys() - current.keys():
+            changed.discard(p)
+            removed.add(p)
+            last_change = time.monotonic()
+        seen = current